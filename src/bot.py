@@ -1,22 +1,83 @@
 import discord
-print(">>> BOT.PY VERSION: 2024-12-11-v4-AUTO-CREATE <<<", flush=True)
 import io
 from collections import deque
 from discord.ext import commands
 from typing import Optional
 import asyncio
+import functools
+import hashlib
+import logging
 import os
-from config.config import Config, Role
-from db.redis_client import RedisClient
+import re
+import time
+import types
+import orjson
+from config.config import Config
+from db.redis_client import RedisClient, DEFAULT_MODEL, DEFAULT_ROLE
 from ai.anthropic_client import AnthropicClient
 from ai.openai_client import OpenAIClient
 from ai.google_client import GoogleAIClient
 from ai.flux_client import FluxClient
 from ai.fluxpro_client import FluxProClient
 from ai.recraft_client import ReCraftClient
+from ai.base_image_client import BaseImageClient
 
 from utils.helpers import send_chunked_message
+from utils.limiter import AIMDLimiter
+from utils.cache import TTLCache
 
+logger = logging.getLogger(__name__)
+
+BOT_VERSION = "2024-12-11-v4-AUTO-CREATE"
+
+# Upper bound on memoized ID strings before the cache is reset
+ID_STR_CACHE_SIZE = 4096
+
+# Seconds a channel's (allowed, model, role) lookup is served from memory
+CHANNEL_CONFIG_TTL = 30
+# Upper bound on cached channel configs; least recently used are evicted first
+CHANNEL_CONFIG_CACHE_SIZE = 4096
+# AI responses kept for identical repeat requests, and for how many seconds
+AI_RESPONSE_CACHE_SIZE = 2048
+AI_RESPONSE_CACHE_TTL = 600
+# Seconds to wait on shutdown for queued context writes to reach Redis
+CONTEXT_FLUSH_TIMEOUT = 5
+# Seconds an AI response may take before the typing indicator is shown
+TYPING_DELAY = 2.0
+
+# Channel argument: a <#123> mention, #123 or a bare channel ID
+_CHAN_RE = re.compile(r'^<?#?(\d+)>?$')
+
+def _parse_channel_id(arg: str) -> Optional[int]:
+    """Extract the channel ID from a command argument, or None if it is not one"""
+    match = _CHAN_RE.match(arg)
+    return int(match.group(1)) if match else None
+
+
+def _response_cache_key(model: str, role_id: str, context: list[dict], message: str) -> bytes:
+    """Digest of everything an AI response depends on"""
+    payload = orjson.dumps([model, role_id, context, message.strip()])
+    return hashlib.blake2b(payload, digest_size=16).digest()
+
+
+def _describe_handler(handler) -> tuple[Optional[str], Optional[str]]:
+    """Extract (summary, usage) for help from a handler docstring of the form
+    'Handle the x command - summary' with an optional 'Usage: ...' line"""
+    lines = [line.strip() for line in (handler.__doc__ or "").strip().splitlines()]
+    summary = (lines[0].partition(" - ")[2] or None) if lines else None
+    usage = next((line[len("Usage:"):].strip() for line in lines if line.startswith("Usage:")), None)
+    return summary, usage
+
+
+def require_permissions(handler):
+    """Only run a command handler for admins, moderators and the bot owner"""
+    @functools.wraps(handler)
+    async def wrapper(self, ctx, *args, **kwargs):
+        if not self.has_permissions(ctx):
+            await ctx.send("You need administrator, moderator, or bot owner permissions to use this command.")
+            return
+        return await handler(self, ctx, *args, **kwargs)
+    return wrapper
 
 
 class AIBot(commands.Bot):
@@ -28,14 +89,33 @@ class AIBot(commands.Bot):
         intents.guilds = True          # Needed for guild-related features
         intents.guild_messages = True  # Needed for messages in guilds
 
-        super().__init__(command_prefix="!", intents=intents)
-        print("Initializing AIBot...", flush=True)
+        # Prefix commands are dispatched from command_handlers, so help is built
+        # from that table instead of discord.py's (empty) command registry
+        super().__init__(command_prefix="!", intents=intents, help_command=None)
+        logger.info("Initializing AIBot (version %s)...", BOT_VERSION)
         self.config = config
-        self.redis_client = RedisClient(config.redis_host, config.redis_port)
+        self.redis_client = RedisClient(config.redis_host, config.redis_port, config.redis_max_connections)
         self.owner_id = int(config.owner_id)
         
         # Message deduplication buffer
         self.processed_messages = deque(maxlen=100)
+
+        # Decimal strings of recently seen Discord IDs (see _sid)
+        self._id_str: dict[int, str] = {}
+
+        # blake2b digest of (model, role_id, context, message) -> response
+        self._response_cache = TTLCache(maxsize=AI_RESPONSE_CACHE_SIZE, ttl=AI_RESPONSE_CACHE_TTL)
+
+        # (server_id, channel_id, user_id, message, response) turns waiting to
+        # be saved; drained by a background task started in setup_hook
+        self._context_writes: asyncio.Queue = asyncio.Queue()
+        self._context_writer: Optional[asyncio.Task] = None
+
+        # Servers whose legacy single-channel setting has been migrated
+        self._migrated_servers: set[str] = set()
+
+        # (server_id, channel_id) -> (allowed, model, role_id)
+        self._channel_cfg_cache = TTLCache(maxsize=CHANNEL_CONFIG_CACHE_SIZE, ttl=CHANNEL_CONFIG_TTL)
         
         # Initialize AI clients
         self.ai_clients = {
@@ -48,12 +128,25 @@ class AIBot(commands.Bot):
             "recraft": ReCraftClient(config.replicate_api_token)
         }
 
+        # Models and roles are fixed for the bot's lifetime, so precompute
+        # the validation sets and the lists shown in command replies
+        self._models_set = frozenset(self.ai_clients)
+        self._roles_set = frozenset(self.config.roles)
+        self._models_csv = ', '.join(self.ai_clients)
+        self._roles_csv = ', '.join(self.config.roles)
+        self._role_prompts = {role_id: role.system_prompt for role_id, role in self.config.roles.items()}
+
+        # (model, stripped prompt) -> running generation task
+        self._img_inflight: dict[tuple[str, str], asyncio.Task] = {}
+        # Paces image generation so bursts of commands back off on Replicate 429s
+        self._image_limiter = AIMDLimiter(initial=2, maximum=8, requests_per_minute=60)
 
 
 
 
-        # Command handlers dictionary
-        self.command_handlers = {
+
+        # Command handlers dictionary, read-only once built
+        self.command_handlers = types.MappingProxyType({
             'addchan': self._handle_add_channel,
             'mute': self._handle_mute_channel,
             'listchans': self._handle_list_channels,
@@ -71,35 +164,83 @@ class AIBot(commands.Bot):
             'listservers': self._handle_list_servers,
             'leaveserver': self._handle_leave_server,
             # Image generation commands
-            'flux': lambda ctx, prompt: self._handle_image_generation(ctx, prompt, "flux"),
-            'fluxpro': lambda ctx, prompt: self._handle_image_generation(ctx, prompt, "fluxpro"),
-            'recraft': lambda ctx, prompt: self._handle_image_generation(ctx, prompt, "recraft"),
-
-        }
-        print("AIBot initialization complete.", flush=True)
+            'flux': self._image_command("flux"),
+            'fluxpro': self._image_command("fluxpro"),
+            'recraft': self._image_command("recraft"),
+            'help': self._handle_help,
+        })
+        # The table is fixed, so the !help listing is built once
+        help_lines = ["**Commands:**"]
+        for name, handler in self.command_handlers.items():
+            summary, _ = _describe_handler(handler)
+            help_lines.append(f"`{self.command_prefix}{name}`" + (f" - {summary}" if summary else ""))
+        self._help_text = "\n".join(help_lines)
+        logger.info("AIBot initialization complete.")
 
     async def setup_hook(self):
         """This is called when the bot is ready to start"""
         self._setup_hook_ran = True
-        print("Executing setup_hook...", flush=True)
-        self.add_commands()
+        logger.info("Executing setup_hook...")
+
+        self._start_session()
+
+        if self.config.debug_profiling:
+            # Log every callback that blocks the event loop for more than 50ms;
+            # asyncio's warning names the task, e.g. the _handle_* coroutine
+            loop = asyncio.get_running_loop()
+            loop.set_debug(True)
+            loop.slow_callback_duration = 0.05
+            logger.info("Event loop profiling enabled (slow_callback_duration=50ms)")
+
+    def _start_session(self):
+        """Set up state that needs the logged-in user and a running loop.
+        Normally done in setup_hook; safe to call again, it only runs once."""
+        if self._context_writer is not None:
+            return
+
+        # The bot user is known once logged in; precompile the pattern for both
+        # mention forms (<@id> and the legacy nickname form <@!id>) stripped from prompts
+        self._mention_re = re.compile(rf'<@!?{self.user.id}>')
 
+        self._context_writer = asyncio.create_task(self._drain_context_writes())
+
+    async def close(self):
+        """Shut down the bot, flush pending context writes and release the Redis connection pool"""
+        await super().close()
+        if self._context_writer is not None:
+            try:
+                await asyncio.wait_for(self._context_writes.join(), timeout=CONTEXT_FLUSH_TIMEOUT)
+            except asyncio.TimeoutError:
+                logger.warning("Dropping %d unsaved context writes", self._context_writes.qsize())
+            self._context_writer.cancel()
+        await self.redis_client.close()
+
+    async def _drain_context_writes(self):
+        """Persist queued conversation turns one at a time, in arrival order"""
+        while True:
+            item = await self._context_writes.get()
+            try:
+                await self.redis_client.add_to_context(*item)
+            except Exception:
+                logger.exception("Error saving context")
+            finally:
+                self._context_writes.task_done()
 
     async def on_ready(self):
-        print(f"Logged in as {self.user} (ID: {self.user.id})", flush=True)
-        print("------", flush=True)
+        logger.info("Logged in as %s (ID: %s)", self.user, self.user.id)
         
         # Fallback sync if setup_hook didn't run for some reason
         if not hasattr(self, '_setup_hook_ran'):
-             print("Warning: setup_hook did not run! Syncing tree from on_ready...", flush=True)
+             logger.warning("setup_hook did not run! Syncing tree from on_ready...")
+             self._start_session()
              try:
                  await self.tree.sync()
-                 print("Command tree synced from on_ready.", flush=True)
+                 logger.info("Command tree synced from on_ready.")
              except Exception as e:
-                 print(f"Failed to sync tree from on_ready: {e}", flush=True)
+                 logger.error("Failed to sync tree from on_ready: %s", e)
 
         if not hasattr(self, '_custom_sync_ran'):
-             print("Invoking custom_sync from on_ready (fallback)...", flush=True)
+             logger.info("Invoking custom_sync from on_ready (fallback)...")
              # Assuming custom_sync is a method that needs to be defined or removed if not used elsewhere.
              # For now, keeping the call as per instruction, but it's not defined in the provided snippet.
              # If it's meant to be self.tree.sync(), then the above block handles it.
@@ -119,244 +260,223 @@ class AIBot(commands.Bot):
         )
 
 
-    async def has_permissions(self, ctx) -> bool:
+    def _sid(self, snowflake: int) -> str:
+        """Return a Discord ID as the string used in Redis keys, memoized per ID"""
+        cached = self._id_str.get(snowflake)
+        if cached is None:
+            if len(self._id_str) >= ID_STR_CACHE_SIZE:
+                self._id_str.clear()
+            cached = self._id_str[snowflake] = str(snowflake)
+        return cached
+
+    def _invalidate_channel_config(self, server_id: str, channel_id: Optional[str] = None):
+        """Drop cached channel config after an admin command changed it.
+        Without a channel, drop every cached channel of the server (server-wide change)."""
+        if channel_id is not None:
+            self._channel_cfg_cache.pop((server_id, channel_id), None)
+            return
+        for key in [key for key in self._channel_cfg_cache if key[0] == server_id]:
+            self._channel_cfg_cache.pop(key)
+
+    async def _ensure_migrated(self, server_id: str):
+        """Migrate old single-channel data once per server per process"""
+        if server_id in self._migrated_servers:
+            return
+        await self.redis_client.migrate_single_to_multi_channel(server_id)
+        self._migrated_servers.add(server_id)
+
+    def _resolve_channel(self, ctx, channel_arg: Optional[str]
+                         ) -> tuple[Optional[discord.abc.GuildChannel], Optional[str]]:
+        """Resolve a channel argument (#channel-name or channel ID) to a guild channel.
+        Without an argument the current channel is used. Returns (channel, error_message)."""
+        if not channel_arg:
+            return ctx.channel, None
+        parsed_id = _parse_channel_id(channel_arg)
+        if parsed_id is None:
+            return None, "Invalid channel format. Use #channel-name or channel ID."
+        # Check if it's a valid channel in the guild
+        channel = ctx.guild.get_channel(parsed_id)
+        if not channel:
+            return None, "Channel not found. Please provide a valid channel mention or ID."
+        return channel, None
+
+    def has_permissions(self, ctx) -> bool:
         """Check if user has required permissions (admin, moderator, or bot owner)"""
-        return (
-            ctx.author.id == self.owner_id or
-            (ctx.guild and (
-                ctx.author.guild_permissions.administrator or
-                ctx.author.guild_permissions.moderate_members
-            ))
-        )
+        if ctx.author.id == self.owner_id:
+            return True
+        if not ctx.guild:
+            return False
+        # guild_permissions is computed from the member's roles on every access
+        perms = ctx.author.guild_permissions
+        return perms.administrator or perms.moderate_members
 
 
 
 
-    def add_commands(self):
-        """Register commands using the command handlers dictionary"""
-        print(f"DEBUG: add_commands called, registering {len(self.command_handlers)} commands", flush=True)
-        
-        for cmd_name, handler in self.command_handlers.items():
-            print(f"DEBUG: Registering command: {cmd_name}", flush=True)
-            
-            # Create a closure that properly captures the handler
-            def make_callback(h):
-                async def callback(ctx, *, arg=None):
-                    print(f"DEBUG: Command callback invoked by {ctx.author}", flush=True)
-                    if arg is None:
-                        await h(ctx)
-                    else:
-                        await h(ctx, arg)
-                return callback
-            
-            # Create and add command explicitly instead of using decorator
-            cmd = commands.Command(make_callback(handler), name=cmd_name)
-            self.add_command(cmd)
-        
-        print(f"DEBUG: Total commands registered: {len(self.commands)}", flush=True)
-        for c in self.commands:
-            print(f"DEBUG: - {c}", flush=True)
+    async def _dispatch_command(self, message: discord.Message):
+        """Dispatch a prefix command straight from the command handlers dictionary.
 
-    async def _handle_add_channel(self, ctx, channel_arg=None):
-        """Handle the addchan command - adds channel to allowed channels"""
-        if not await self.has_permissions(ctx):
-            await ctx.send("You need administrator permissions or need to be the bot owner to use this command.")
+        Commands that are not in the dictionary still go through discord.py.
+        """
+        # Ordinary chat is neither kind of command; skip building a context
+        # and discord.py's command lookup for it entirely
+        if message.author.bot or not message.content.startswith(self.command_prefix):
             return
 
-        server_id = str(ctx.guild.id)
-
-        # Migrate old single-channel data if exists
-        self.redis_client.migrate_single_to_multi_channel(server_id)
+        parts = message.content[len(self.command_prefix):].split(None, 1)
+        handler = self.command_handlers.get(parts[0]) if parts else None
+        if handler is None:
+            await self.process_commands(message)
+            return
 
-        # Determine which channel to add
-        if channel_arg:
-            # User specified a channel (format: #channel-name or channel_id)
-            # Try to parse channel mention or ID
-            channel_id = channel_arg.strip('<>#')
-            try:
-                # Check if it's a valid channel in the guild
-                channel = ctx.guild.get_channel(int(channel_id))
-                if not channel:
-                    await ctx.send(f"Channel not found. Please provide a valid channel mention or ID.")
-                    return
-                channel_id = str(channel.id)
-            except ValueError:
-                await ctx.send(f"Invalid channel format. Use #channel-name or channel ID.")
-                return
+        logger.debug("Command %s invoked by %s", parts[0], message.author)
+        ctx = await self.get_context(message)
+        if len(parts) == 1:
+            await handler(ctx)
         else:
-            # No argument provided, add current channel
-            channel_id = str(ctx.channel.id)
+            await handler(ctx, parts[1].strip())
 
-        # Add channel to allowed channels
-        self.redis_client.add_allowed_channel(server_id, channel_id)
-        await ctx.send(f"AI bot will now respond in <#{channel_id}>.")
+    @require_permissions
+    async def _handle_add_channel(self, ctx, channel_arg=None):
+        """Handle the addchan command - adds channel to allowed channels
+        Usage: !addchan [#channel]
+        """
+        await self._apply_channel_mutation(
+            ctx, channel_arg,
+            self.redis_client.add_allowed_channel,
+            "AI bot will now respond in <#{channel_id}>."
+        )
 
+    @require_permissions
     async def _handle_mute_channel(self, ctx, channel_arg=None):
-        """Handle the mute command - removes channel from allowed channels"""
-        if not await self.has_permissions(ctx):
-            await ctx.send("You need administrator permissions or need to be the bot owner to use this command.")
-            return
+        """Handle the mute command - removes channel from allowed channels
+        Usage: !mute [#channel]
+        """
+        await self._apply_channel_mutation(
+            ctx, channel_arg,
+            self.redis_client.remove_allowed_channel,
+            "AI bot will no longer respond in <#{channel_id}>."
+        )
 
-        server_id = str(ctx.guild.id)
+    async def _apply_channel_mutation(self, ctx, channel_arg, mutate, reply: str):
+        """Shared body of addchan/mute: resolve the target channel, apply
+        the allowed-channels mutation and confirm with the reply template"""
+        server_id = self._sid(ctx.guild.id)
 
         # Migrate old single-channel data if exists
-        self.redis_client.migrate_single_to_multi_channel(server_id)
+        await self._ensure_migrated(server_id)
 
-        # Determine which channel to mute
-        if channel_arg:
-            # User specified a channel (format: #channel-name or channel_id)
-            # Try to parse channel mention or ID
-            channel_id = channel_arg.strip('<>#')
-            try:
-                # Check if it's a valid channel in the guild
-                channel = ctx.guild.get_channel(int(channel_id))
-                if not channel:
-                    await ctx.send(f"Channel not found. Please provide a valid channel mention or ID.")
-                    return
-                channel_id = str(channel.id)
-            except ValueError:
-                await ctx.send(f"Invalid channel format. Use #channel-name or channel ID.")
-                return
-        else:
-            # No argument provided, mute current channel
-            channel_id = str(ctx.channel.id)
+        # Determine which channel to update
+        channel, error = self._resolve_channel(ctx, channel_arg)
+        if error:
+            await ctx.send(error)
+            return
+        channel_id = self._sid(channel.id)
 
-        # Remove channel from allowed channels
-        self.redis_client.remove_allowed_channel(server_id, channel_id)
-        await ctx.send(f"AI bot will no longer respond in <#{channel_id}>.")
+        await mutate(server_id, channel_id)
+        self._invalidate_channel_config(server_id, channel_id)
+        await ctx.send(reply.format(channel_id=channel_id))
 
+    @require_permissions
     async def _handle_list_channels(self, ctx):
         """Handle the listchans command - lists all allowed channels"""
-        if not await self.has_permissions(ctx):
-            await ctx.send("You need administrator permissions or need to be the bot owner to use this command.")
-            return
-
-        server_id = str(ctx.guild.id)
+        server_id = self._sid(ctx.guild.id)
 
         # Migrate old single-channel data if exists
-        self.redis_client.migrate_single_to_multi_channel(server_id)
+        await self._ensure_migrated(server_id)
 
-        allowed_channels = self.redis_client.get_allowed_channels(server_id)
+        allowed_channels = await self.redis_client.get_allowed_channels(server_id)
 
         if not allowed_channels:
             await ctx.send("No channels are currently configured. Use !addchan to add channels.")
             return
 
-        channel_mentions = [f"<#{channel_id}>" for channel_id in allowed_channels]
-        await ctx.send(f"Allowed channels:\n" + "\n".join(f"- {mention}" for mention in channel_mentions))
+        await ctx.send("Allowed channels:\n" + "\n".join(f"- <#{channel_id}>" for channel_id in allowed_channels))
 
+    @require_permissions
     async def _handle_clear_channels(self, ctx):
         """Handle the clearchans command - removes all allowed channels"""
-        if not await self.has_permissions(ctx):
-            await ctx.send("You need administrator permissions or need to be the bot owner to use this command.")
-            return
-
-        server_id = str(ctx.guild.id)
-        self.redis_client.clear_allowed_channels(server_id)
+        server_id = self._sid(ctx.guild.id)
+        await self.redis_client.clear_allowed_channels(server_id)
+        self._invalidate_channel_config(server_id)
         await ctx.send("All allowed channels have been cleared. Bot will not respond in any channel until channels are added with !addchan.")
 
+    @require_permissions
     async def _handle_set_model(self, ctx, args=None):
-        """Handle the setmodel command - supports optional channel parameter
+        """Handle the setmodel command - sets the AI model for a channel
         Usage: !setmodel <model> [#channel]
         """
-        if not await self.has_permissions(ctx):
-            await ctx.send("You need administrator permissions or need to be the bot owner to use this command.")
-            return
-
         if args is None:
-            await ctx.send(f"Please specify a model. Available models: {', '.join(self.ai_clients.keys())}")
+            await ctx.send(f"Please specify a model. Available models: {self._models_csv}")
             return
 
         # Parse arguments: model and optional channel
         parts = args.split()
         if len(parts) == 0:
-            await ctx.send(f"Please specify a model. Available models: {', '.join(self.ai_clients.keys())}")
+            await ctx.send(f"Please specify a model. Available models: {self._models_csv}")
             return
 
         model = parts[0]
         target_channel = None
 
         # Check if model is valid
-        if model not in self.ai_clients:
-            await ctx.send(f"Invalid model. Available models: {', '.join(self.ai_clients.keys())}")
+        if model not in self._models_set:
+            await ctx.send(f"Invalid model. Available models: {self._models_csv}")
             return
 
-        # Check if channel was specified
-        if len(parts) > 1:
-            # User specified a channel (format: #channel-name or channel_id)
-            channel_arg = parts[1].strip('<>#')
-            try:
-                # Check if it's a valid channel in the guild
-                target_channel = ctx.guild.get_channel(int(channel_arg))
-                if not target_channel:
-                    await ctx.send(f"Channel not found. Please provide a valid channel mention or ID.")
-                    return
-            except ValueError:
-                await ctx.send(f"Invalid channel format. Use #channel-name or channel ID.")
-                return
-        else:
-            # No channel specified, use current channel
-            target_channel = ctx.channel
+        # Use the specified channel, or the current one
+        target_channel, error = self._resolve_channel(ctx, parts[1] if len(parts) > 1 else None)
+        if error:
+            await ctx.send(error)
+            return
 
-        server_id = str(ctx.guild.id)
-        channel_id = str(target_channel.id)
+        server_id = self._sid(ctx.guild.id)
+        channel_id = self._sid(target_channel.id)
 
         # Set channel-specific model
-        self.redis_client.set_channel_model(server_id, channel_id, model)
+        await self.redis_client.set_channel_model(server_id, channel_id, model)
+        self._invalidate_channel_config(server_id, channel_id)
         await ctx.send(f"AI model set to **{model}** for <#{channel_id}>")
 
+    @require_permissions
     async def _handle_set_role(self, ctx, args=None):
-        """Handle the setrole command - supports optional channel parameter
+        """Handle the setrole command - sets the AI role for a channel
         Usage: !setrole <role> [#channel]
         """
-        if not await self.has_permissions(ctx):
-            await ctx.send("You need administrator permissions or need to be the bot owner to use this command.")
-            return
-
         if args is None:
-            await ctx.send(f"Please specify a role. Available roles: {', '.join(self.config.roles.keys())}")
+            await ctx.send(f"Please specify a role. Available roles: {self._roles_csv}")
             return
 
         # Parse arguments: role and optional channel
         parts = args.split()
         if len(parts) == 0:
-            await ctx.send(f"Please specify a role. Available roles: {', '.join(self.config.roles.keys())}")
+            await ctx.send(f"Please specify a role. Available roles: {self._roles_csv}")
             return
 
         role = parts[0]
         target_channel = None
 
         # Check if role is valid
-        if role not in self.config.roles:
-            await ctx.send(f"Invalid role. Available roles: {', '.join(self.config.roles.keys())}")
+        if role not in self._roles_set:
+            await ctx.send(f"Invalid role. Available roles: {self._roles_csv}")
             return
 
-        # Check if channel was specified
-        if len(parts) > 1:
-            # User specified a channel (format: #channel-name or channel_id)
-            channel_arg = parts[1].strip('<>#')
-            try:
-                # Check if it's a valid channel in the guild
-                target_channel = ctx.guild.get_channel(int(channel_arg))
-                if not target_channel:
-                    await ctx.send(f"Channel not found. Please provide a valid channel mention or ID.")
-                    return
-            except ValueError:
-                await ctx.send(f"Invalid channel format. Use #channel-name or channel ID.")
-                return
-        else:
-            # No channel specified, use current channel
-            target_channel = ctx.channel
+        # Use the specified channel, or the current one
+        target_channel, error = self._resolve_channel(ctx, parts[1] if len(parts) > 1 else None)
+        if error:
+            await ctx.send(error)
+            return
 
-        server_id = str(ctx.guild.id)
-        channel_id = str(target_channel.id)
+        server_id = self._sid(ctx.guild.id)
+        channel_id = self._sid(target_channel.id)
 
         # Set channel-specific role
-        self.redis_client.set_channel_role(server_id, channel_id, role)
+        await self.redis_client.set_channel_role(server_id, channel_id, role)
+        self._invalidate_channel_config(server_id, channel_id)
         await ctx.send(f"AI role set to **{role}** for <#{channel_id}>")
 
     async def _handle_list_roles(self, ctx):
-        """Handle the listroles command"""
+        """Handle the listroles command - lists available AI roles"""
         roles_info = "\n".join([
             f"**{role_id}**: {role.description}"
             for role_id, role in self.config.roles.items()
@@ -364,82 +484,64 @@ class AIBot(commands.Bot):
         await ctx.send(f"Available roles:\n{roles_info}")
 
     async def _handle_list_models(self, ctx):
-        """Handle the listmodels command"""
-        models_info = ", ".join(self.ai_clients.keys())
-        await ctx.send(f"Available models: {models_info}")
+        """Handle the listmodels command - lists available AI models"""
+        await ctx.send(f"Available models: {self._models_csv}")
 
+    @require_permissions
     async def _handle_set_default_model(self, ctx, model=None):
         """Handle the setdefaultmodel command - sets server-wide default model
         Usage: !setdefaultmodel <model>
         """
-        if not await self.has_permissions(ctx):
-            await ctx.send("You need administrator, moderator, or bot owner permissions to use this command.")
-            return
-
         if model is None:
-            await ctx.send(f"Please specify a model. Available models: {', '.join(self.ai_clients.keys())}\nUsage: !setdefaultmodel <model>")
+            await ctx.send(f"Please specify a model. Available models: {self._models_csv}\nUsage: !setdefaultmodel <model>")
             return
 
-        if model not in self.ai_clients:
-            await ctx.send(f"Invalid model. Available models: {', '.join(self.ai_clients.keys())}")
+        if model not in self._models_set:
+            await ctx.send(f"Invalid model. Available models: {self._models_csv}")
             return
 
-        server_id = str(ctx.guild.id)
-        self.redis_client.set_default_model(server_id, model)
+        server_id = self._sid(ctx.guild.id)
+        await self.redis_client.set_default_model(server_id, model)
+        self._invalidate_channel_config(server_id)
         await ctx.send(f"Server default AI model set to **{model}**. Channels without specific model settings will use this model.")
 
+    @require_permissions
     async def _handle_set_default_role(self, ctx, role=None):
         """Handle the setdefaultrole command - sets server-wide default role
         Usage: !setdefaultrole <role>
         """
-        if not await self.has_permissions(ctx):
-            await ctx.send("You need administrator, moderator, or bot owner permissions to use this command.")
-            return
-
         if role is None:
-            await ctx.send(f"Please specify a role. Available roles: {', '.join(self.config.roles.keys())}\nUsage: !setdefaultrole <role>")
+            await ctx.send(f"Please specify a role. Available roles: {self._roles_csv}\nUsage: !setdefaultrole <role>")
             return
 
-        if role not in self.config.roles:
-            await ctx.send(f"Invalid role. Available roles: {', '.join(self.config.roles.keys())}")
+        if role not in self._roles_set:
+            await ctx.send(f"Invalid role. Available roles: {self._roles_csv}")
             return
 
-        server_id = str(ctx.guild.id)
-        self.redis_client.set_default_role(server_id, role)
+        server_id = self._sid(ctx.guild.id)
+        await self.redis_client.set_default_role(server_id, role)
+        self._invalidate_channel_config(server_id)
         await ctx.send(f"Server default AI role set to **{role}**. Channels without specific role settings will use this role.")
 
     async def _handle_channel_config(self, ctx, args=None):
         """Handle the channelconfig command - show channel-specific configuration
         Usage: !channelconfig [#channel]
         """
-        server_id = str(ctx.guild.id)
-        target_channel = None
+        server_id = self._sid(ctx.guild.id)
 
         # Parse optional channel argument
-        if args:
-            channel_arg = args.strip().split()[0].strip('<>#')
-            try:
-                target_channel = ctx.guild.get_channel(int(channel_arg))
-                if not target_channel:
-                    await ctx.send(f"Channel not found. Please provide a valid channel mention or ID.")
-                    return
-            except ValueError:
-                await ctx.send(f"Invalid channel format. Use #channel-name or channel ID.")
-                return
-        else:
-            # No channel specified, use current channel
-            target_channel = ctx.channel
-
-        channel_id = str(target_channel.id)
+        target_channel, error = self._resolve_channel(ctx, args.split()[0] if args else None)
+        if error:
+            await ctx.send(error)
+            return
 
-        # Get channel-specific and server-wide settings
-        channel_role_raw = self.redis_client.redis.get(f"channel_role:{server_id}:{channel_id}")
-        server_role_raw = self.redis_client.redis.get(f"role:{server_id}")
-        effective_role = self.redis_client.get_channel_role(server_id, channel_id)
+        channel_id = self._sid(target_channel.id)
 
-        channel_model_raw = self.redis_client.redis.get(f"channel_model:{server_id}:{channel_id}")
-        server_model_raw = self.redis_client.redis.get(f"model:{server_id}")
-        effective_model = self.redis_client.get_channel_model(server_id, channel_id)
+        # Get channel-specific and server-wide settings in a single round trip
+        channel_role_raw, server_role_raw, channel_model_raw, server_model_raw = \
+            await self.redis_client.get_channel_config_bundle(server_id, channel_id)
+        effective_role = channel_role_raw or server_role_raw or DEFAULT_ROLE
+        effective_model = channel_model_raw or server_model_raw or DEFAULT_MODEL
 
         # Determine role source
         if channel_role_raw:
@@ -464,57 +566,46 @@ class AIBot(commands.Bot):
         )
         await ctx.send(config_message)
 
+    @require_permissions
     async def _handle_clear_channel_config(self, ctx, args=None):
         """Handle the clearchannelconfig command - clear channel-specific settings
         Usage: !clearchannelconfig [#channel]
         """
-        if not await self.has_permissions(ctx):
-            await ctx.send("You need administrator permissions or need to be the bot owner to use this command.")
-            return
-
-        server_id = str(ctx.guild.id)
-        target_channel = None
+        server_id = self._sid(ctx.guild.id)
 
         # Parse optional channel argument
-        if args:
-            channel_arg = args.strip().split()[0].strip('<>#')
-            try:
-                target_channel = ctx.guild.get_channel(int(channel_arg))
-                if not target_channel:
-                    await ctx.send(f"Channel not found. Please provide a valid channel mention or ID.")
-                    return
-            except ValueError:
-                await ctx.send(f"Invalid channel format. Use #channel-name or channel ID.")
-                return
-        else:
-            # No channel specified, use current channel
-            target_channel = ctx.channel
+        target_channel, error = self._resolve_channel(ctx, args.split()[0] if args else None)
+        if error:
+            await ctx.send(error)
+            return
 
-        channel_id = str(target_channel.id)
+        channel_id = self._sid(target_channel.id)
 
         # Clear channel-specific settings
-        self.redis_client.clear_channel_role(server_id, channel_id)
-        self.redis_client.clear_channel_model(server_id, channel_id)
+        await asyncio.gather(
+            self.redis_client.clear_channel_role(server_id, channel_id),
+            self.redis_client.clear_channel_model(server_id, channel_id)
+        )
+        self._invalidate_channel_config(server_id, channel_id)
 
         await ctx.send(f"Channel-specific settings cleared for <#{channel_id}>. Now using server-wide settings.")
 
+    @require_permissions
     async def _handle_status(self, ctx):
         """Handle the status command - shows server defaults and per-channel settings"""
-        if not await self.has_permissions(ctx):
-            await ctx.send("You need administrator, moderator, or bot owner permissions to use this command.")
-            return
-
-        server_id = str(ctx.guild.id)
+        server_id = self._sid(ctx.guild.id)
 
         # Migrate old single-channel data if exists
-        self.redis_client.migrate_single_to_multi_channel(server_id)
-
-        # Get server defaults
-        default_model = self.redis_client.get_default_model(server_id)
-        default_role = self.redis_client.get_default_role(server_id)
+        await self._ensure_migrated(server_id)
 
         # Get allowed channels
-        allowed_channels = self.redis_client.get_allowed_channels(server_id)
+        allowed_channels = await self.redis_client.get_allowed_channels(server_id)
+
+        # Get server defaults and every channel's settings in a single round trip
+        server_role, server_model, channel_config = \
+            await self.redis_client.get_channel_settings_bulk(server_id, allowed_channels)
+        default_model = server_model or DEFAULT_MODEL
+        default_role = server_role or DEFAULT_ROLE
 
         if not allowed_channels:
             status_message = (
@@ -525,24 +616,23 @@ class AIBot(commands.Bot):
                 f"Use !addchan to add channels."
             )
         else:
-            # Build channel settings list showing each channel's configuration
-            channel_settings = []
-            for channel_id in allowed_channels:
-                role = self.redis_client.get_channel_role(server_id, channel_id)
-                model = self.redis_client.get_channel_model(server_id, channel_id)
-                channel_settings.append(f"  - <#{channel_id}>: Role=**{role}**, Model=**{model}**")
+            # Show each channel's configuration, falling back to the server defaults
+            channel_settings = "\n".join(
+                f"  - <#{channel_id}>: Role=**{role or default_role}**, Model=**{model or default_model}**"
+                for channel_id, (role, model) in channel_config.items()
+            )
 
             status_message = (
                 f"**Server Defaults:**\n"
                 f"- Default Model: {default_model}\n"
                 f"- Default Role: {default_role}\n\n"
-                f"**Channel Settings:**\n" + "\n".join(channel_settings)
+                f"**Channel Settings:**\n{channel_settings}"
             )
 
         await ctx.send(status_message)
 
     async def _handle_shutdown(self, ctx):
-        """Handle the shutdown command"""
+        """Handle the shutdown command - shuts the bot down (owner only)"""
         if ctx.author.id != self.owner_id:
             await ctx.send("Only the bot owner can use this command.")
             return
@@ -551,7 +641,7 @@ class AIBot(commands.Bot):
         await self.close()
 
     async def _handle_list_servers(self, ctx):
-        """Handle the listservers command"""
+        """Handle the listservers command - lists the servers the bot is in (owner only)"""
         if ctx.author.id != self.owner_id:
             await ctx.send("Only the bot owner can use this command.")
             return
@@ -560,7 +650,9 @@ class AIBot(commands.Bot):
         await ctx.send(f"Currently active in these servers:\n{servers}")
 
     async def _handle_leave_server(self, ctx, server_id=None):
-        """Handle the leaveserver command"""
+        """Handle the leaveserver command - makes the bot leave a server (owner only)
+        Usage: !leaveserver <server_id>
+        """
         if ctx.author.id != self.owner_id:
             await ctx.send("Only the bot owner can use this command.")
             return
@@ -579,7 +671,38 @@ class AIBot(commands.Bot):
         except ValueError:
             await ctx.send("Invalid server ID format. Please provide a valid number.")
 
-    async def _handle_image_generation(self, ctx, prompt: Optional[str], model: str):
+    def _image_command(self, model: str):
+        """Build the command handler for an image model, resolving its client once"""
+        image_client = self.ai_clients[model]
+
+        async def handler(ctx, prompt: Optional[str] = None):
+            await self._handle_image_generation(ctx, prompt, model, image_client)
+        handler.__doc__ = f"""Handle the {model} command - generates an image with {model}
+        Usage: !{model} <prompt>
+        """
+        return handler
+
+    async def _handle_help(self, ctx, args=None):
+        """Handle the help command - lists commands, or shows usage for one
+        Usage: !help [command]
+        """
+        if args is None:
+            await ctx.send(self._help_text)
+            return
+
+        name = args.split()[0].removeprefix(self.command_prefix)
+        handler = self.command_handlers.get(name)
+        if handler is None:
+            await ctx.send(f'No command called "{name}" found.')
+            return
+
+        summary, usage = _describe_handler(handler)
+        lines = [f"`{usage or self.command_prefix + name}`"]
+        if summary:
+            lines.append(summary)
+        await ctx.send("\n".join(lines))
+
+    async def _handle_image_generation(self, ctx, prompt: Optional[str], model: str, image_client):
         """
         Handle image generation commands for different models.
         
@@ -587,24 +710,30 @@ class AIBot(commands.Bot):
             ctx: The Discord context
             prompt: The image generation prompt
             model: The model identifier to use for generation
+            image_client: The image client for the model, resolved at startup
         """
         if prompt is None:
             await ctx.send(f"Please provide a prompt for the {model} image generation.")
             return
 
+        started = time.perf_counter()
         async with ctx.typing():
             try:
-                # Get the appropriate image client
-                image_client = self.ai_clients.get(model)
-                if not image_client:
-                    await ctx.send(f"The {model} image generation service is not properly configured.")
-                    return
-
-                # Generate the image
-                image_data = await image_client.generate_image(prompt)
+                # Generate the image; identical prompts already in progress
+                # share the running generation instead of paying for another
+                key = (model, prompt.strip())
+                task = self._img_inflight.get(key)
+                if task is None:
+                    task = asyncio.create_task(self._generate_image(image_client, prompt))
+                    self._img_inflight[key] = task
+                    task.add_done_callback(lambda _: self._img_inflight.pop(key, None))
+                # Shield so one cancelled caller does not cancel the others
+                image_data = await asyncio.shield(task)
                 
                 if image_data:
-                    # Create Discord file object from the image bytes
+                    # Create Discord file object from the image bytes. BytesIO
+                    # shares the bytes buffer until written to, so this does
+                    # not duplicate the image in memory.
                     file = discord.File(
                         io.BytesIO(image_data), 
                         filename=f"{model}_generated.png"
@@ -616,73 +745,112 @@ class AIBot(commands.Bot):
                 else:
                     await ctx.send(f"Failed to generate image with {model}.")
             except Exception as e:
-                print(f"Error generating image with {model}: {str(e)}")  # Log the error
+                logger.exception("Error generating image with %s", model)
                 await ctx.send(f"Error generating image with {model}: {str(e)}")
+            finally:
+                elapsed_ms = (time.perf_counter() - started) * 1000
+                logger.info("⏱️ cmd=%s total=%.0fms", model, elapsed_ms)
 
-
+    async def _generate_image(self, image_client, prompt: str) -> Optional[bytes]:
+        """Run one image generation under the adaptive Replicate limiter"""
+        async with self._image_limiter.acquire():
+            return await image_client.generate_image(prompt)
 
     async def get_ai_response(self,
                             server_id: str,
                             channel_id: str,
                             user_id: str,
-                            message: str) -> Optional[str]:
-        """Get AI response for a message"""
+                            message: str,
+                            channel: Optional[discord.abc.Messageable] = None) -> Optional[str]:
+        """Get AI response for a message.
+        Pass the channel the message arrived in to skip looking it up again."""
         # Migrate old single-channel data if exists
-        self.redis_client.migrate_single_to_multi_channel(server_id)
-
-        # Check if channel is allowed (multi-channel support)
-        if not self.redis_client.is_channel_allowed(server_id, channel_id):
-            return None
-
-        channel = self.get_channel(int(channel_id))
-        async with channel.typing():  # Show typing indicator while processing
-            # Get current model and role (channel-specific with fallback)
-            model = self.redis_client.get_channel_model(server_id, channel_id)
-            role_id = self.redis_client.get_channel_role(server_id, channel_id)
-            role: Role = self.config.roles[role_id]
-
-            # Get conversation context
-            context = self.redis_client.get_context(server_id, channel_id)
-
-            try:
+        await self._ensure_migrated(server_id)
+
+        # Whether the channel is allowed (multi-channel support) and its model
+        # and role (channel-specific with fallback) rarely change, so serve
+        # them from memory; otherwise load them together with the
+        # conversation context in a single round trip
+        cache_key = (server_id, channel_id)
+        cached = self._channel_cfg_cache.get(cache_key)
+        if cached:
+            allowed, model, role_id = cached
+            if not allowed:
+                return None
+            context = await self.redis_client.get_context(server_id, channel_id)
+        else:
+            allowed, model, role_id, context = await self.redis_client.load_channel_state(server_id, channel_id)
+            self._channel_cfg_cache[cache_key] = (allowed, model, role_id)
+            if not allowed:
+                return None
+
+        system_prompt = self._role_prompts[role_id]
+
+        # Only show the typing indicator once the model is slow to answer;
+        # quick responses then cost no typing requests at all
+        if channel is None:
+            channel = self.get_channel(int(channel_id))
+        typing_task = asyncio.create_task(self._typing_after_delay(channel, TYPING_DELAY))
+        try:
+            # The same request (model, role, history and message) seen again
+            # within a few minutes, e.g. a message sent twice, reuses the answer.
+            # Image clients are skipped: they report failures as a normal
+            # response string, which must not be replayed.
+            ai_client = self.ai_clients[model]
+            cacheable = not isinstance(ai_client, BaseImageClient)
+            response_key = _response_cache_key(model, role_id, context, message)
+            response = self._response_cache.get(response_key) if cacheable else None
+            if response is None:
                 # Generate response with timeout
-                ai_client = self.ai_clients[model]
                 response = await asyncio.wait_for(
                     ai_client.generate_response(
-                        role.system_prompt,
+                        system_prompt,
                         context,
                         message
                     ),
                     timeout=120.0  # Extended timeout for image generation
                 )
-
-                # Save to context
-                self.redis_client.add_to_context(
-                    server_id,
-                    channel_id,
-                    user_id,
-                    message,
-                    response
-                )
-
-                return response
-            except asyncio.TimeoutError:
-                return "I apologize, but the response took too long. Please try again."
-            except Exception as e:
-                print(f"Error generating response: {str(e)}")  # Log the error
-                return f"Error generating response: {str(e)}"
+                if cacheable:
+                    self._response_cache[response_key] = response
+
+            # Save to context in the background so the reply is not held
+            # back by the Redis write
+            self._context_writes.put_nowait((server_id, channel_id, user_id, message, response))
+
+            return response
+        except asyncio.TimeoutError:
+            return "I apologize, but the response took too long. Please try again."
+        except Exception as e:
+            logger.exception("Error generating response")
+            return f"Error generating response: {str(e)}"
+        finally:
+            typing_task.cancel()
+
+    @staticmethod
+    async def _typing_after_delay(channel, delay: float):
+        """Show the typing indicator after delay seconds until cancelled"""
+        await asyncio.sleep(delay)
+        try:
+            async with channel.typing():
+                await asyncio.Future()
+        except discord.HTTPException as e:
+            # e.g. Forbidden without Send Messages; the reply itself still goes out
+            logger.warning("Could not show typing indicator in %s: %s", channel, e)
 
     async def on_guild_join(self, guild):
         """Called when the bot joins a new guild"""
-        print(f"Joined new guild: {guild.name} (ID: {guild.id})")
+        logger.info("Joined new guild: %s (ID: %s)", guild.name, guild.id)
 
     async def on_message(self, message: discord.Message):
         """Called when a message is received"""
-        print(f"DEBUG: on_message called for msg_id={message.id} from {message.author}: {message.content[:50]}", flush=True)
-
-        # Ignore messages from the bot itself
-        if message.author == self.user:
+        # Ignore messages from the bot itself before doing any other work
+        if message.author.id == self.user.id:
             return
+        # Messages can arrive before on_ready; covers a skipped setup_hook
+        if self._context_writer is None:
+            self._start_session()
+
+        logger.debug("on_message called for msg_id=%s from %s: %.50s", message.id, message.author, message.content)
 
         # Deduplication check - must be BEFORE process_commands to prevent double command execution
         if message.id in self.processed_messages:
@@ -690,25 +858,26 @@ class AIBot(commands.Bot):
         self.processed_messages.append(message.id)
 
         # Process commands
-        await self.process_commands(message)
+        await self._dispatch_command(message)
 
         # Only respond to mentions
         if self.user not in message.mentions:
             return
 
-        print(f"DEBUG: Bot mentioned by {message.author}. content={message.content}", flush=True)
+        logger.debug("Bot mentioned by %s. content=%s", message.author, message.content)
 
         # Remove the mention from the message
-        content = message.content.replace(f'<@{self.user.id}>', '').strip()
+        content = self._mention_re.sub('', message.content).strip()
 
-        print(f"DEBUG: Requesting AI response for: {content}", flush=True)
+        logger.debug("Requesting AI response for: %s", content)
         response = await self.get_ai_response(
-            str(message.guild.id),
-            str(message.channel.id),
-            str(message.author.id),
-            content
+            self._sid(message.guild.id),
+            self._sid(message.channel.id),
+            self._sid(message.author.id),
+            content,
+            message.channel
         )
-        print(f"DEBUG: AI Response received: {bool(response)}", flush=True)
+        logger.debug("AI Response received: %s", bool(response))
 
         if response:
             await send_chunked_message(message.channel, response, reference=message)
@@ -1,7 +1,10 @@
+import logging
 import os
 from dataclasses import dataclass
 import yaml
 
+logger = logging.getLogger(__name__)
+
 @dataclass
 class Role:
     name: str
@@ -17,7 +20,9 @@ class Config:
         self.replicate_api_token = os.getenv('REPLICATE_API_TOKEN')
         self.redis_host = os.getenv('REDIS_HOST', 'localhost')
         self.redis_port = int(os.getenv('REDIS_PORT', 6379))
+        self.redis_max_connections = int(os.getenv('REDIS_MAX_CONNECTIONS', 10))
         self.owner_id = os.getenv('OWNER_ID')
+        self.debug_profiling = os.getenv('DEBUG_PROFILING', 'false').lower() in ('1', 'true', 'yes')
         self.roles = self._load_roles()
 
         # Validate required environment variables
@@ -35,12 +40,11 @@ class Config:
         try:
             with open('src/config/roles.yaml', 'r', encoding='utf-8') as f:
                 content = f.read()
-                print("YAML Content:")
-                print(content)  # Debug print
+                logger.debug("YAML Content:\n%s", content)
                 roles_data = yaml.safe_load(content)
                 
                 if not roles_data:
-                    print("Empty YAML file")
+                    logger.warning("Empty YAML file")
                     return {}
 
                 roles = {}
@@ -52,8 +56,8 @@ class Config:
                     )
                 return roles
         except yaml.YAMLError as e:
-            print(f"YAML parsing error: {str(e)}")
+            logger.error("YAML parsing error: %s", e)
             raise
         except Exception as e:
-            print(f"Error loading roles: {str(e)}")
+            logger.error("Error loading roles: %s", e)
             raise ValueError(f"Failed to load roles: {str(e)}")
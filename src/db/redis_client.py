@@ -1,22 +1,56 @@
-import json
 from typing import Optional
-import redis
+import orjson
+import pyzstd
+import redis.asyncio
+from redis.client import NEVER_DECODE
+
+# Frame header every zstd payload starts with; used to tell compressed
+# context blobs apart from legacy plain-JSON ones
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+CONTEXT_COMPRESSION_LEVEL = 3
+
+# Hardcoded fallbacks used when neither a channel nor a server setting exists
+DEFAULT_MODEL = "claude"
+DEFAULT_ROLE = "default"
+
+def _encode_context(context: list[dict]) -> bytes:
+    return pyzstd.compress(orjson.dumps(context), CONTEXT_COMPRESSION_LEVEL)
+
+def _decode_context(raw: Optional[bytes]) -> list[dict]:
+    if not raw:
+        return []
+    if raw.startswith(ZSTD_MAGIC):
+        raw = pyzstd.decompress(raw)
+    return orjson.loads(raw)
 
 class RedisClient:
-    def __init__(self, host: str, port: int):
-        self.redis = redis.Redis(host=host, port=port, decode_responses=True)
+    def __init__(self, host: str, port: int, max_connections: int = 10):
+        # Bounded pool shared by all coroutines; when every connection is in
+        # use, callers wait for one to be released instead of erroring out
+        # The client takes ownership of the pool and disconnects it on close
+        self.redis = redis.asyncio.Redis.from_pool(redis.asyncio.BlockingConnectionPool(
+            host=host,
+            port=port,
+            decode_responses=True,
+            max_connections=max_connections
+        ))
         self.max_context_messages = 30  # Store 30 messages per channel
         self.context_expiry = 7200      # 2 hours expiry
 
-    def get_context(self, server_id: str, channel_id: str) -> list[dict]:
+    async def close(self):
+        """Close the client and its connection pool"""
+        await self.redis.aclose()
+
+    async def get_context(self, server_id: str, channel_id: str) -> list[dict]:
         key = f"context:{server_id}:{channel_id}"
-        context = self.redis.get(key)
-        return json.loads(context) if context else []
+        # Context is stored zstd-compressed, so skip the client's utf-8 decoding
+        context = await self.redis.execute_command("GET", key, **{NEVER_DECODE: []})
+        return _decode_context(context)
 
-    def add_to_context(self, server_id: str, channel_id: str, 
-                      user_id: str, message: str, response: str):
+    async def add_to_context(self, server_id: str, channel_id: str,
+                             user_id: str, message: str, response: str):
         key = f"context:{server_id}:{channel_id}"
-        context = self.get_context(server_id, channel_id)
+        context = await self.get_context(server_id, channel_id)
         
         context.append({
             "user_id": user_id,
@@ -28,160 +62,213 @@ class RedisClient:
         if len(context) > self.max_context_messages:
             context = context[-self.max_context_messages:]
             
-        self.redis.set(key, json.dumps(context))
-        self.redis.expire(key, self.context_expiry)  # Expire after 2 hours
+        # Write and set the 2 hour expiry in a single command
+        await self.redis.set(key, _encode_context(context), ex=self.context_expiry)
 
-    def get_allowed_channel(self, server_id: str) -> Optional[str]:
+    async def get_allowed_channel(self, server_id: str) -> Optional[str]:
         """Legacy method - kept for backwards compatibility"""
-        return self.redis.get(f"allowed_channel:{server_id}")
+        return await self.redis.get(f"allowed_channel:{server_id}")
 
-    def set_allowed_channel(self, server_id: str, channel_id: str):
+    async def set_allowed_channel(self, server_id: str, channel_id: str):
         """Legacy method - kept for backwards compatibility"""
-        self.redis.set(f"allowed_channel:{server_id}", channel_id)
+        await self.redis.set(f"allowed_channel:{server_id}", channel_id)
 
     # Multi-channel support methods
-    def add_allowed_channel(self, server_id: str, channel_id: str):
+    async def add_allowed_channel(self, server_id: str, channel_id: str):
         """Add a channel to the list of allowed channels"""
         key = f"allowed_channels:{server_id}"
-        self.redis.sadd(key, channel_id)
+        await self.redis.sadd(key, channel_id)
 
-    def remove_allowed_channel(self, server_id: str, channel_id: str):
+    async def remove_allowed_channel(self, server_id: str, channel_id: str):
         """Remove a channel from the list of allowed channels"""
         key = f"allowed_channels:{server_id}"
-        self.redis.srem(key, channel_id)
+        await self.redis.srem(key, channel_id)
 
-    def get_allowed_channels(self, server_id: str) -> list[str]:
+    async def get_allowed_channels(self, server_id: str) -> list[str]:
         """Get all allowed channels for a server"""
         key = f"allowed_channels:{server_id}"
-        channels = self.redis.smembers(key)
+        channels = await self.redis.smembers(key)
         return list(channels) if channels else []
 
-    def is_channel_allowed(self, server_id: str, channel_id: str) -> bool:
+    async def is_channel_allowed(self, server_id: str, channel_id: str) -> bool:
         """Check if a channel is allowed for a server"""
         key = f"allowed_channels:{server_id}"
-        return self.redis.sismember(key, channel_id)
+        return await self.redis.sismember(key, channel_id)
 
-    def clear_allowed_channels(self, server_id: str):
+    async def clear_allowed_channels(self, server_id: str):
         """Clear all allowed channels for a server"""
         key = f"allowed_channels:{server_id}"
-        self.redis.delete(key)
+        await self.redis.delete(key)
 
-    def migrate_single_to_multi_channel(self, server_id: str):
+    async def migrate_single_to_multi_channel(self, server_id: str):
         """Migrate from single-channel to multi-channel format"""
-        old_channel = self.get_allowed_channel(server_id)
+        old_channel = await self.get_allowed_channel(server_id)
         if old_channel:
             # Add the old channel to the new multi-channel set
-            self.add_allowed_channel(server_id, old_channel)
+            await self.add_allowed_channel(server_id, old_channel)
             # Remove the old key
-            self.redis.delete(f"allowed_channel:{server_id}")
+            await self.redis.delete(f"allowed_channel:{server_id}")
 
-    def get_server_model(self, server_id: str) -> str:
-        return self.redis.get(f"model:{server_id}") or "claude"
+    async def get_server_model(self, server_id: str) -> str:
+        return await self.redis.get(f"model:{server_id}") or DEFAULT_MODEL
 
-    def set_server_model(self, server_id: str, model: str):
-        self.redis.set(f"model:{server_id}", model)
+    async def set_server_model(self, server_id: str, model: str):
+        await self.redis.set(f"model:{server_id}", model)
 
-    def get_server_role(self, server_id: str) -> str:
-        return self.redis.get(f"role:{server_id}") or "default"
+    async def get_server_role(self, server_id: str) -> str:
+        return await self.redis.get(f"role:{server_id}") or DEFAULT_ROLE
 
-    def set_server_role(self, server_id: str, role: str):
-        self.redis.set(f"role:{server_id}", role)
+    async def set_server_role(self, server_id: str, role: str):
+        await self.redis.set(f"role:{server_id}", role)
 
     # Alias methods for server-wide defaults (same as server-wide methods above)
-    def get_default_model(self, server_id: str) -> str:
+    async def get_default_model(self, server_id: str) -> str:
         """Get server-wide default model (alias for get_server_model)"""
-        return self.get_server_model(server_id)
+        return await self.get_server_model(server_id)
 
-    def set_default_model(self, server_id: str, model: str):
+    async def set_default_model(self, server_id: str, model: str):
         """Set server-wide default model (alias for set_server_model)"""
-        self.set_server_model(server_id, model)
+        await self.set_server_model(server_id, model)
 
-    def get_default_role(self, server_id: str) -> str:
+    async def get_default_role(self, server_id: str) -> str:
         """Get server-wide default role (alias for get_server_role)"""
-        return self.get_server_role(server_id)
+        return await self.get_server_role(server_id)
 
-    def set_default_role(self, server_id: str, role: str):
+    async def set_default_role(self, server_id: str, role: str):
         """Set server-wide default role (alias for set_server_role)"""
-        self.set_server_role(server_id, role)
+        await self.set_server_role(server_id, role)
+
+    async def get_channel_settings_bulk(self, server_id: str, channel_ids: list[str]
+                                        ) -> tuple[Optional[str], Optional[str], dict[str, tuple[Optional[str], Optional[str]]]]:
+        """Fetch server-wide and per-channel role/model settings with a single MGET.
+
+        Returns the raw values as (server_role, server_model, {channel_id: (role, model)}),
+        with None for anything that is not set; callers resolve the fallback chain.
+        """
+        keys = [f"role:{server_id}", f"model:{server_id}"]
+        for channel_id in channel_ids:
+            keys.append(f"channel_role:{server_id}:{channel_id}")
+            keys.append(f"channel_model:{server_id}:{channel_id}")
+        server_role, server_model, *channel_values = await self.redis.mget(keys)
+
+        channels = dict(zip(channel_ids, zip(channel_values[::2], channel_values[1::2])))
+        return server_role, server_model, channels
+
+    async def get_channel_config_bundle(self, server_id: str, channel_id: str
+                                        ) -> tuple[Optional[str], Optional[str], Optional[str], Optional[str]]:
+        """Fetch one channel's role/model settings with a single MGET.
+
+        Returns the raw values as (channel_role, server_role, channel_model, server_model),
+        with None for anything that is not set; callers resolve the fallback chain.
+        """
+        channel_role, server_role, channel_model, server_model = await self.redis.mget(
+            f"channel_role:{server_id}:{channel_id}",
+            f"role:{server_id}",
+            f"channel_model:{server_id}:{channel_id}",
+            f"model:{server_id}"
+        )
+        return channel_role, server_role, channel_model, server_model
+
+    async def load_channel_state(self, server_id: str, channel_id: str) -> tuple[bool, str, str, list[dict]]:
+        """Fetch everything needed to answer a message in one round trip.
+
+        Returns (allowed, model, role, context) with the model and role
+        already resolved through the channel → server → default chain.
+        """
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.sismember(f"allowed_channels:{server_id}", channel_id)
+        pipe.get(f"channel_model:{server_id}:{channel_id}")
+        pipe.get(f"model:{server_id}")
+        pipe.get(f"channel_role:{server_id}:{channel_id}")
+        pipe.get(f"role:{server_id}")
+        pipe.execute_command("GET", f"context:{server_id}:{channel_id}", **{NEVER_DECODE: []})
+        allowed, channel_model, server_model, channel_role, server_role, context = await pipe.execute()
+
+        return (
+            bool(allowed),
+            channel_model or server_model or DEFAULT_MODEL,
+            channel_role or server_role or DEFAULT_ROLE,
+            _decode_context(context)
+        )
 
     # Channel-specific role methods
-    def get_channel_role(self, server_id: str, channel_id: str) -> str:
+    async def get_channel_role(self, server_id: str, channel_id: str) -> str:
         """Get role for specific channel with fallback chain:
         1. Channel-specific role
         2. Server-wide role
         3. Default role
         """
         # Try channel-specific first
-        channel_role = self.redis.get(f"channel_role:{server_id}:{channel_id}")
+        channel_role = await self.redis.get(f"channel_role:{server_id}:{channel_id}")
         if channel_role:
             return channel_role
 
         # Fall back to server-wide
-        server_role = self.redis.get(f"role:{server_id}")
+        server_role = await self.redis.get(f"role:{server_id}")
         if server_role:
             return server_role
 
         # Fall back to default
-        return "default"
+        return DEFAULT_ROLE
 
-    def set_channel_role(self, server_id: str, channel_id: str, role: str):
+    async def set_channel_role(self, server_id: str, channel_id: str, role: str):
         """Set role for specific channel"""
-        self.redis.set(f"channel_role:{server_id}:{channel_id}", role)
+        await self.redis.set(f"channel_role:{server_id}:{channel_id}", role)
 
-    def clear_channel_role(self, server_id: str, channel_id: str):
+    async def clear_channel_role(self, server_id: str, channel_id: str):
         """Remove channel-specific role (falls back to server-wide)"""
-        self.redis.delete(f"channel_role:{server_id}:{channel_id}")
+        await self.redis.delete(f"channel_role:{server_id}:{channel_id}")
 
-    def get_all_channel_roles(self, server_id: str) -> dict[str, str]:
+    async def get_all_channel_roles(self, server_id: str) -> dict[str, str]:
         """Get all channel→role mappings for server"""
         pattern = f"channel_role:{server_id}:*"
-        keys = self.redis.keys(pattern)
+        keys = await self.redis.keys(pattern)
         result = {}
         for key in keys:
             # Extract channel_id from key
             channel_id = key.split(":")[-1]
-            role = self.redis.get(key)
+            role = await self.redis.get(key)
             if role:
                 result[channel_id] = role
         return result
 
     # Channel-specific model methods
-    def get_channel_model(self, server_id: str, channel_id: str) -> str:
+    async def get_channel_model(self, server_id: str, channel_id: str) -> str:
         """Get model for specific channel with fallback chain:
         1. Channel-specific model
         2. Server-wide model
         3. Default model (claude)
         """
         # Try channel-specific first
-        channel_model = self.redis.get(f"channel_model:{server_id}:{channel_id}")
+        channel_model = await self.redis.get(f"channel_model:{server_id}:{channel_id}")
         if channel_model:
             return channel_model
 
         # Fall back to server-wide
-        server_model = self.redis.get(f"model:{server_id}")
+        server_model = await self.redis.get(f"model:{server_id}")
         if server_model:
             return server_model
 
         # Fall back to default
-        return "claude"
+        return DEFAULT_MODEL
 
-    def set_channel_model(self, server_id: str, channel_id: str, model: str):
+    async def set_channel_model(self, server_id: str, channel_id: str, model: str):
         """Set model for specific channel"""
-        self.redis.set(f"channel_model:{server_id}:{channel_id}", model)
+        await self.redis.set(f"channel_model:{server_id}:{channel_id}", model)
 
-    def clear_channel_model(self, server_id: str, channel_id: str):
+    async def clear_channel_model(self, server_id: str, channel_id: str):
         """Remove channel-specific model (falls back to server-wide)"""
-        self.redis.delete(f"channel_model:{server_id}:{channel_id}")
+        await self.redis.delete(f"channel_model:{server_id}:{channel_id}")
 
-    def get_all_channel_models(self, server_id: str) -> dict[str, str]:
+    async def get_all_channel_models(self, server_id: str) -> dict[str, str]:
         """Get all channel→model mappings for server"""
         pattern = f"channel_model:{server_id}:*"
-        keys = self.redis.keys(pattern)
+        keys = await self.redis.keys(pattern)
         result = {}
         for key in keys:
             # Extract channel_id from key
             channel_id = key.split(":")[-1]
-            model = self.redis.get(key)
+            model = await self.redis.get(key)
             if model:
                 result[channel_id] = model
         return result
@@ -1,36 +1,64 @@
 import asyncio
 import os
 import logging
+import logging.handlers
+import queue
 import discord
 from dotenv import load_dotenv
 from bot import AIBot
 from config.config import Config
 
+try:
+    import uvloop
+except ImportError:  # uvloop is not available on Windows
+    uvloop = None
+
+logger = logging.getLogger(__name__)
+
 async def main():
     # Load environment variables
     load_dotenv()
     
-    # Configure logging
-    logging.basicConfig(
-        level=logging.INFO,
-        format='%(asctime)s %(levelname)s: %(message)s',
+    # Configure logging. Records are queued and written to stderr by a
+    # background listener thread so the event loop never blocks on I/O.
+    log_queue = queue.SimpleQueue()
+    stream_handler = logging.StreamHandler()
+    stream_handler.setFormatter(logging.Formatter(
+        '%(asctime)s %(levelname)s: %(message)s',
         datefmt='%Y-%m-%d %H:%M:%S'
+    ))
+    log_listener = logging.handlers.QueueListener(log_queue, stream_handler)
+    # QueueHandler.prepare() bakes its formatted output into the queued
+    # record, so it must only render the message; the listener's handler
+    # adds the timestamp and level. basicConfig keeps a formatter that is
+    # already set.
+    queue_handler = logging.handlers.QueueHandler(log_queue)
+    queue_handler.setFormatter(logging.Formatter('%(message)s'))
+    logging.basicConfig(
+        level=os.getenv('LOG_LEVEL', 'INFO').upper(),
+        handlers=[queue_handler]
     )
+    log_listener.start()
     
     # Set higher logging level for noisy libraries if needed
     # logging.getLogger('discord').setLevel(logging.DEBUG)
 
     try:
-        print(f"Discord.py Version: {discord.__version__}", flush=True)
+        logger.info("Discord.py Version: %s", discord.__version__)
         config = Config()
         bot = AIBot(config)
-        print("Starting bot...", flush=True)
-        print(f"Token present: {bool(config.discord_token)}", flush=True)
+        logger.info("Starting bot...")
+        logger.info("Token present: %s", bool(config.discord_token))
         await bot.start(config.discord_token)
-        print("Bot start returned (unexpected)", flush=True)
+        logger.warning("Bot start returned (unexpected)")
     except Exception as e:
-        print(f"Error starting bot: {e}", flush=True)
+        logger.error("Error starting bot: %s", e)
         raise
+    finally:
+        log_listener.stop()
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    if uvloop is not None:
+        uvloop.run(main())
+    else:
+        asyncio.run(main())
@@ -1,33 +1,58 @@
 from typing import Optional
 import discord
 
-async def send_chunked_message(channel: discord.TextChannel, message: str, reference: Optional[discord.Message] = None):
+MAX_MESSAGE_LENGTH = 2000   # Discord limit for plain message content
+MAX_EMBED_TOTAL = 6000      # Discord limit for the text of all embeds in one message
+# Two full embeds fill a message, so long responses need half as many sends
+EMBED_CHUNK_LENGTH = MAX_EMBED_TOTAL // 2
+
+def _split_message(message: str, max_length: int) -> list[str]:
     """
-    Sends a message in chunks if it exceeds Discord's character limit
+    Splits a message on line boundaries into chunks of at most max_length characters
     """
-    max_length = 2000
-    
-    if len(message) <= max_length:
-        return await channel.send(message, reference=reference)
-    
     chunks = []
     current_chunk = ""
-    
+
     for line in message.split('\n'):
+        # Hard-wrap single lines that would not fit in any chunk
+        wrapped = False
+        while len(line) >= max_length:
+            if current_chunk:
+                chunks.append(current_chunk)
+                current_chunk = ""
+            chunks.append(line[:max_length])
+            line = line[max_length:]
+            wrapped = True
+        if wrapped and not line:
+            continue
+
         if len(current_chunk) + len(line) + 1 <= max_length:
             current_chunk += line + '\n'
         else:
             if current_chunk:
                 chunks.append(current_chunk)
             current_chunk = line + '\n'
-    
+
     if current_chunk:
         chunks.append(current_chunk)
-    
-    # Send first chunk with reference
-    if chunks:
-        await channel.send(chunks[0], reference=reference)
-        
-    # Send remaining chunks
-    for chunk in chunks[1:]:
-        await channel.send(chunk)
+
+    # Whitespace-only chunks would render as blank embeds
+    return [chunk for chunk in chunks if chunk.strip()]
+
+async def send_chunked_message(channel: discord.TextChannel, message: str, reference: Optional[discord.Message] = None):
+    """
+    Sends a message in chunks if it exceeds Discord's character limit.
+    Long messages are packed into embeds, two per message, which carries three
+    times the text of a plain message per API call.
+    """
+    if len(message) <= MAX_MESSAGE_LENGTH:
+        return await channel.send(message, reference=reference)
+
+    embeds = [discord.Embed(description=chunk) for chunk in _split_message(message, EMBED_CHUNK_LENGTH)]
+
+    # Send first batch with reference
+    await channel.send(embeds=embeds[:2], reference=reference)
+
+    # Send remaining batches
+    for i in range(2, len(embeds), 2):
+        await channel.send(embeds=embeds[i:i + 2])
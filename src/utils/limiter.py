@@ -0,0 +1,74 @@
+import asyncio
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Optional
+
+class AIMDLimiter:
+    """
+    Adaptive concurrency limiter for a rate-limited upstream API.
+
+    The number of calls allowed in flight grows additively while calls succeed
+    (within the latency target, if one is set) and is cut multiplicatively when
+    the upstream answers with HTTP 429. An optional requests-per-minute cap is
+    enforced proactively with a sliding window of call start times.
+    """
+
+    def __init__(self,
+                 initial: float = 2,
+                 maximum: float = 8,
+                 minimum: float = 1,
+                 increase: float = 0.5,
+                 decrease: float = 0.5,
+                 latency_target: Optional[float] = None,
+                 requests_per_minute: Optional[int] = None):
+        self.limit = initial
+        self.maximum = maximum
+        self.minimum = minimum
+        self.increase = increase
+        self.decrease = decrease
+        self.latency_target = latency_target
+        self.requests_per_minute = requests_per_minute
+        self._in_flight = 0
+        self._condition = asyncio.Condition()
+        self._recent_starts = deque()
+
+    @asynccontextmanager
+    async def acquire(self):
+        """Wait for a free slot, run the wrapped call and adjust the limit from its outcome"""
+        async with self._condition:
+            await self._condition.wait_for(lambda: self._in_flight < int(self.limit))
+            self._in_flight += 1
+
+        rate_limited = False
+        succeeded = False
+        try:
+            await self._wait_for_rate_window()
+            started = time.monotonic()
+            yield
+            succeeded = self.latency_target is None or time.monotonic() - started <= self.latency_target
+        except Exception as e:
+            rate_limited = getattr(e, "status", None) == 429
+            raise
+        finally:
+            async with self._condition:
+                self._in_flight -= 1
+                if rate_limited:
+                    self.limit = max(self.minimum, self.limit * self.decrease)
+                elif succeeded:
+                    self.limit = min(self.maximum, self.limit + self.increase)
+                self._condition.notify_all()
+
+    async def _wait_for_rate_window(self):
+        """Block until starting another call keeps us under requests_per_minute"""
+        if not self.requests_per_minute:
+            return
+
+        while True:
+            now = time.monotonic()
+            while self._recent_starts and now - self._recent_starts[0] >= 60:
+                self._recent_starts.popleft()
+            if len(self._recent_starts) < self.requests_per_minute:
+                self._recent_starts.append(now)
+                return
+            await asyncio.sleep(60 - (now - self._recent_starts[0]))
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The bot imports its packages relative to src/ (e.g. `from utils.helpers import ...`)
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
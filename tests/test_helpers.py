@@ -0,0 +1,25 @@
+import pytest
+
+pytest.importorskip("discord")
+
+from utils.helpers import _split_message
+
+MAX = 3000
+
+
+def test_line_of_exactly_max_length_is_one_chunk():
+    assert _split_message("a" * MAX, MAX) == ["a" * MAX]
+
+
+def test_line_just_under_max_length_keeps_its_newline():
+    assert _split_message("a" * (MAX - 1), MAX) == ["a" * (MAX - 1) + "\n"]
+
+
+def test_line_over_twice_max_length_is_hard_wrapped():
+    assert _split_message("a" * (2 * MAX + 1), MAX) == ["a" * MAX, "a" * MAX, "a\n"]
+
+
+def test_no_chunk_exceeds_max_or_is_blank():
+    message = "\n".join(["a" * MAX, "", "b" * 10, "c" * (MAX - 1)])
+    chunks = _split_message(message, MAX)
+    assert all(0 < len(chunk) <= MAX and chunk.strip() for chunk in chunks)